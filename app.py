@@ -1,6 +1,9 @@
 import streamlit as st
 import time
-from rag_system import UKPolicyRAG, fetch_news, get_available_topics, answer_query
+import queue
+import threading
+from rag_system import UKPolicyRAG
+from llm_model import Gemma3LLM
 
 # Set page config
 st.set_page_config(
@@ -18,10 +21,42 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource
+def get_llm():
+    """Initialize the LLM client once so it survives reruns."""
+    return Gemma3LLM()
+
 @st.cache_resource
 def get_rag_system():
     """Initialize the RAG system once and cache it."""
-    return UKPolicyRAG()
+    return UKPolicyRAG(llm=get_llm())
+
+@st.cache_data(ttl=1800, show_spinner=False)
+def cached_topics(fingerprint: str, _rag: UKPolicyRAG) -> list:
+    """
+    Extract topics, reusing the result while the stored article set is unchanged.
+    
+    Failures raise, and Streamlit does not cache exceptions, so the next
+    load tries again instead of showing the error for the whole TTL.
+    """
+    return _rag.get_topics()
+
+def load_topics(rag: UKPolicyRAG) -> list:
+    """Return the current topics, or a message in their place if they could not be extracted."""
+    try:
+        return cached_topics(rag.index_stats(), rag)
+    except LookupError as e:
+        return [str(e)]
+    except Exception as e:
+        print(f"Error extracting topics: {e}")
+        return ["Error extracting topics"]
+
+def run_refresh(rag: UKPolicyRAG, result_queue: queue.Queue) -> None:
+    """Fetch and store articles on a background thread, reporting the outcome on the queue."""
+    try:
+        result_queue.put(rag.fetch_and_store_articles())
+    except Exception as e:
+        result_queue.put(e)
 
 def main():
     # Display headers
@@ -41,6 +76,9 @@ def main():
     if 'refresh_time' not in st.session_state:
         st.session_state.refresh_time = 0
     
+    if 'refresh_running' not in st.session_state:
+        st.session_state.refresh_running = False
+    
     if 'num_articles' not in st.session_state:
         st.session_state.num_articles = 0
         
@@ -56,7 +94,7 @@ def main():
         if not st.session_state.initialized:
             with st.spinner("Loading RAG system and topics..."):
                 rag = get_rag_system()
-                st.session_state.topics = rag.get_topics()
+                st.session_state.topics = load_topics(rag)
                 st.session_state.initialized = True
         else:
             rag = get_rag_system()
@@ -76,31 +114,46 @@ def main():
         refresh_pressed = st.button("Refresh News Articles", key="refresh_news", use_container_width=True)
         st.info("Fetches articles from BBC, Guardian, and Gov.uk")
         
-        # Process the refresh
-        if refresh_pressed:
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            
-            status_text.text("Initializing...")
-            progress_bar.progress(10)
-            
-            status_text.text("Checking for existing articles...")
-            progress_bar.progress(20)
-            
-            with st.spinner("Fetching and processing articles...(it may take a while!)"):
-                start_time = time.time()
-                num_articles = rag.fetch_and_store_articles()
-                end_time = time.time()
-                
-            progress_bar.progress(100)
-            
-            if num_articles > 0:
-                st.success(f"Successfully added {num_articles} new articles in {end_time - start_time:.2f} seconds!")
-                # Reload topics only if new articles were added
-                with st.spinner("Updating topics..."):
-                    st.session_state.topics = rag.get_topics()
+        # Start the refresh in the background so the rest of the page stays usable
+        if refresh_pressed and not st.session_state.refresh_running:
+            st.session_state.refresh_queue = queue.Queue()
+            st.session_state.refresh_running = True
+            st.session_state.refresh_status = None
+            st.session_state.refresh_time = time.time()
+            threading.Thread(
+                target=run_refresh,
+                args=(rag, st.session_state.refresh_queue),
+                daemon=True
+            ).start()
+        
+        # Check whether a background refresh has finished
+        if st.session_state.refresh_running:
+            try:
+                result = st.session_state.refresh_queue.get_nowait()
+            except queue.Empty:
+                st.info("Fetching and processing articles in the background...(it may take a while!)")
             else:
-                st.info("No new articles found.")
+                st.session_state.refresh_running = False
+                elapsed = time.time() - st.session_state.refresh_time
+                
+                if isinstance(result, Exception):
+                    st.session_state.refresh_status = ("error", f"Error refreshing articles: {result}")
+                elif result > 0:
+                    st.session_state.num_articles = result
+                    st.session_state.refresh_status = ("success", f"Successfully added {result} new articles in {elapsed:.2f} seconds!")
+                    # Reload topics only if new articles were added
+                    with st.spinner("Updating topics..."):
+                        st.session_state.topics = load_topics(rag)
+                else:
+                    st.session_state.refresh_status = ("info", "No new articles found.")
+                
+                # Rerun so the topics above reflect the new articles
+                st.rerun()
+        
+        # Show the outcome of the last refresh
+        if st.session_state.refresh_status:
+            level, message = st.session_state.refresh_status
+            getattr(st, level)(message)
     
     # Right column - Query
     with right_col:
@@ -124,6 +177,7 @@ def main():
             loading_placeholder = st.empty()
             
             # Process the query outside of the callback for better UI control
+            streamed = False
             if submitted and st.session_state.query_input:
                 query = st.session_state.query_input
                 
@@ -134,21 +188,27 @@ def main():
                     # Show loading message in place
                     loading_placeholder.info("Searching for information...")
                     
-                    # Process the query
-                    st.session_state.query_result = rag.query(query)
+                    # Retrieve sources, then stream the answer as it is generated
+                    sources, response_stream = rag.query_stream(query)
                     
                     # Clear the loading message
                     loading_placeholder.empty()
+                    
+                    st.markdown("### Answer")
+                    response = st.write_stream(response_stream)
+                    st.session_state.query_result = {"query": query, "sources": sources, "response": response}
+                    streamed = True
             
             # Display results if available
             if st.session_state.query_result:
                 result = st.session_state.query_result
                 
-                # Display the answer
-                st.markdown("### Answer")
-                st.markdown(f"""<div style="background-color: #f0f2f6; padding: 20px; border-radius: 10px;">
-                    {result["response"]}
-                """, unsafe_allow_html=True)
+                # Display the answer (already rendered if it was just streamed)
+                if not streamed:
+                    st.markdown("### Answer")
+                    st.markdown(f"""<div style="background-color: #f0f2f6; padding: 20px; border-radius: 10px;">
+                        {result["response"]}
+                    """, unsafe_allow_html=True)
                 
                 # Display sources
                 st.markdown("### Sources")
@@ -157,6 +217,11 @@ def main():
                         st.markdown(f"**URL**: [{source['url']}]({source['url']})")
         else:
             st.info("Loading system... Query functionality will be available shortly.")
+    
+    # Poll for the background refresh result
+    if st.session_state.refresh_running:
+        time.sleep(1)
+        st.rerun()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -21,5 +21,10 @@ RSS_FEEDS = {
     "gov_uk": "https://www.gov.uk/government/publications.atom"
 }
 
+# Address of the long-running RAG server used by the command line interface
+RAG_SERVER_HOST = os.environ.get("RAG_SERVER_HOST", "127.0.0.1")
+RAG_SERVER_PORT = int(os.environ.get("RAG_SERVER_PORT", "8000"))
+RAG_SERVER_URL = f"http://{RAG_SERVER_HOST}:{RAG_SERVER_PORT}"
+
 # Gemma 3 model configuration
 GEMMA_MODEL = "google/gemma-3-27b-it" 
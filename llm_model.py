@@ -1,14 +1,127 @@
-from typing import List, Dict, Any
+from typing import TYPE_CHECKING, List, Dict, Any, Coroutine, Iterator, Optional, Tuple, TypeVar
+import asyncio
+import threading
+import hashlib
 import json
 import traceback
 import sys
-from openai import OpenAI
+from diskcache import Cache
 from langchain.schema.document import Document
 from config import NVIDIA_NIM_API_KEY, GEMMA_MODEL
 
+# The OpenAI SDK is imported when the client is created, keeping module import cheap
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
 # Maximum context size for Gemma 3 model
 MAX_CONTEXT_SIZE = 3500  # Keeping some buffer below the 4096 limit
 
+# Base URL for the NVIDIA NIM OpenAI-compatible API
+NIM_BASE_URL = "https://integrate.api.nvidia.com/v1"
+
+T = TypeVar("T")
+
+# Directory for the persistent LLM response cache
+LLM_CACHE_DIR = "./.llm_cache"
+
+def _digest(text: str) -> str:
+    """Return a short content hash of the given text."""
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+class NimBatcher:
+    """
+    Coalesce NIM chat completion requests into concurrent batches.
+    
+    Requests submitted within max_delay_ms of each other (up to max_batch) are
+    dispatched together with asyncio.gather. The batcher runs its own event loop
+    on a daemon thread so synchronous callers on different threads (e.g.
+    concurrent Streamlit sessions) share one AsyncOpenAI connection pool.
+    """
+    
+    def __init__(self, client: "AsyncOpenAI", model_name: str, max_batch: int = 8, max_delay_ms: int = 20):
+        self.client = client
+        self.model_name = model_name
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        
+        self._loop = asyncio.new_event_loop()
+        self._queue: Optional[asyncio.Queue] = None
+        
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, args=(ready,), daemon=True)
+        self._thread.start()
+        ready.wait()
+    
+    def _run_loop(self, ready: threading.Event) -> None:
+        """Run the batcher's event loop forever on the background thread."""
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue()
+        self._loop.create_task(self._collect_batches())
+        ready.set()
+        self._loop.run_forever()
+    
+    async def submit(self, prompt: str, max_tokens: int, temperature: float, **options: Any) -> str:
+        """
+        Queue a completion request and wait for the generated text.
+        
+        Extra options (e.g. response_format) are passed through to the API.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._enqueue(prompt, max_tokens, temperature, options), self._loop)
+        return await asyncio.wrap_future(future)
+    
+    def submit_sync(self, prompt: str, max_tokens: int, temperature: float, **options: Any) -> str:
+        """Queue a completion request and block until the generated text is available."""
+        future = asyncio.run_coroutine_threadsafe(self._enqueue(prompt, max_tokens, temperature, options), self._loop)
+        return future.result()
+    
+    def run(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Run a coroutine on the batcher loop and block until it completes."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+    
+    async def _enqueue(self, prompt: str, max_tokens: int, temperature: float, options: Dict[str, Any]) -> str:
+        """Put a request on the queue (on the batcher loop) and await its result."""
+        result = self._loop.create_future()
+        request = {
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            **options
+        }
+        await self._queue.put((request, result))
+        return await result
+    
+    async def _collect_batches(self) -> None:
+        """Group queued requests into batches and dispatch each without blocking collection."""
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.max_delay
+            
+            while len(batch) < self.max_batch:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            self._loop.create_task(self._dispatch(batch))
+    
+    async def _dispatch(self, batch: List[Any]) -> None:
+        """Send a batch of requests to NIM concurrently and resolve their futures."""
+        responses = await asyncio.gather(
+            *[self.client.chat.completions.create(model=self.model_name, **request) for request, _ in batch],
+            return_exceptions=True
+        )
+        
+        for (_, result), response in zip(batch, responses):
+            if result.done():
+                continue
+            if isinstance(response, BaseException):
+                result.set_exception(response)
+            else:
+                result.set_result(response.choices[0].message.content)
+
 class Gemma3LLM:
     def __init__(self):
         """Initialize the Gemma 3 model with Nvidia NIM."""
@@ -20,69 +133,133 @@ class Gemma3LLM:
         
         # Initialize the OpenAI client configured for NIM
         try:
+            from openai import OpenAI, AsyncOpenAI
+            
             # Using the correct base URL for NVIDIA NIM
             self.client = OpenAI(
                 api_key=self.api_key,
-                base_url="https://integrate.api.nvidia.com/v1"
+                base_url=NIM_BASE_URL
+            )
+            
+            # Async client used by the batcher for concurrent requests
+            self.async_client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=NIM_BASE_URL
             )
+            self.batcher = NimBatcher(self.async_client, self.model_name)
             print("NIM client initialized successfully")
+            
+            # Persistent cache of generated responses, keyed by model and content
+            self.cache = Cache(LLM_CACHE_DIR)
         except Exception as e:
             print(f"Error initializing NIM client: {e}")
             traceback.print_exc(file=sys.stdout)
             raise
     
     def generate_response(self, query: str, docs: List[Document]) -> str:
-        """Generate a response to a query based on retrieved documents."""
+        """
+        Generate a response to a query based on retrieved documents.
+        
+        Raises the underlying error if generation fails, so callers never
+        mistake an error message for an answer (or cache one).
+        """
+        # Create a context from documents (with length limit)
+        context, context_length = self._format_documents_with_limit(docs, MAX_CONTEXT_SIZE)
+        
+        # Return a cached response if this query was already answered from the same context
+        cache_key = self._response_cache_key(query, context)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            print(f"\nUsing cached response for query: {query}")
+            return cached
+        
+        prompt = self._response_prompt(query, context)
+        
+        print(f"\nSending query to NIM API: {query}")
+        print(f"Using model: {self.model_name}")
+        print(f"Context length: {context_length} characters")
+        
+        # Generate response through the request batcher
         try:
-            # Create a context from documents (with length limit)
-            context = self._format_documents_with_limit(docs, MAX_CONTEXT_SIZE)
+            response_text = self.batcher.submit_sync(prompt, max_tokens=1024, temperature=0.3)
+        except Exception as e:
+            print(f"Error in NIM API call: {e}")
+            print(f"Headers: {getattr(e, 'headers', 'No headers')}")
+            print(f"Body: {getattr(e, 'body', 'No body')}")
+            traceback.print_exc(file=sys.stdout)
+            raise
+        
+        print("NIM API response received successfully")
+        self.cache.set(cache_key, response_text)
+        return response_text
+    
+    def generate_response_stream(self, query: str, docs: List[Document]) -> Iterator[str]:
+        """
+        Generate a response to a query, yielding text chunks as NIM produces them.
+        
+        Raises the underlying error if generation fails, after any chunks
+        already yielded.
+        """
+        try:
+            context, context_length = self._format_documents_with_limit(docs, MAX_CONTEXT_SIZE)
             
-            # Create a prompt for the RAG query
-            prompt = f"""Answer the following question in detail about news from UK based on the provided context. 
-            If the question cannot be answered based on the context, simply state that you don't have enough information.
+            # A cached response is yielded whole
+            cache_key = self._response_cache_key(query, context)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                print(f"\nUsing cached response for query: {query}")
+                yield cached
+                return
             
-            Context:
-            {context}
+            prompt = self._response_prompt(query, context)
             
-            Question: {query}
+            print(f"\nStreaming query to NIM API: {query}")
+            print(f"Using model: {self.model_name}")
+            print(f"Context length: {context_length} characters")
             
-            Answer:"""
+            stream = self.client.chat.completions.create(
+                model=self.model_name,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.3,
+                max_tokens=1024,
+                stream=True
+            )
             
-            print(f"\nSending query to NIM API: {query}")
-            print(f"Using model: {self.model_name}")
-            print(f"Context length: {len(context)} characters")
-            
-            # Generate response using the OpenAI client
-            try:
-                response = self.client.chat.completions.create(
-                    model=self.model_name,
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0.3,
-                    max_tokens=1024
-                )
-                
-                print("NIM API response received successfully")
-                return response.choices[0].message.content
-            except Exception as e:
-                print(f"Error in NIM API call: {e}")
-                print(f"Headers: {getattr(e, 'headers', 'No headers')}")
-                print(f"Body: {getattr(e, 'body', 'No body')}")
-                traceback.print_exc(file=sys.stdout)
-                return f"Sorry, I encountered an error with the NIM API: {str(e)}"
-                
+            parts = []
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                text = chunk.choices[0].delta.content or ""
+                if text:
+                    parts.append(text)
+                    yield text
+            
+            print("NIM API stream completed successfully")
+            self.cache.set(cache_key, "".join(parts))
         except Exception as e:
-            print(f"Error generating response: {e}")
+            print(f"Error in NIM API stream: {e}")
             traceback.print_exc(file=sys.stdout)
-            return "Sorry, I encountered an error while generating a response."
+            raise
     
     def extract_topics(self, docs: List[Document], max_topics: int = 10) -> List[str]:
         """Extract main topics from a collection of documents."""
+        return self.batcher.run(self.extract_topics_async(docs, max_topics))
+    
+    async def extract_topics_async(self, docs: List[Document], max_topics: int = 10) -> List[str]:
+        """Extract main topics from a collection of documents without blocking the event loop."""
         try:
             # Sample documents to keep within token limits
             sample_docs = docs[:min(len(docs), 15)]  # Take at most 15 documents
             
             # Create a context from sampled documents
-            context = self._format_documents_with_limit(sample_docs, MAX_CONTEXT_SIZE)
+            context, _ = self._format_documents_with_limit(sample_docs, MAX_CONTEXT_SIZE)
+            
+            # Return cached topics if the same articles were already processed
+            cache_key = _digest("|".join([self.model_name, "topics", str(max_topics), _digest(context)]))
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                print(f"\nUsing cached topics for {len(sample_docs)} documents")
+                return cached
             
             # Create a prompt for topic extraction
             prompt = f"""Below are snippets from various news articles about news from UK.
@@ -91,49 +268,64 @@ class Gemma3LLM:
             {context}
             
             Based only on these articles, identify the main topics discussed. 
-            List exactly {max_topics} topics as a bulleted list in the format:
-            • Topic 1
-            • Topic 2
+            List exactly {max_topics} topics.
             
             Keep each topic name very short (1-3 words). Don't use complete sentences. For example, use "NHS Funding" not "The funding challenges facing the NHS".
+            
+            Respond with JSON only: {{"topics": ["Topic 1", "Topic 2"]}}
             """
             
             print(f"\nExtracting topics from {len(sample_docs)} documents")
             
-            # Generate topics using the OpenAI client
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,  # Slightly higher temperature for diversity
-                max_tokens=256
+            # Generate topics through the request batcher as a JSON object
+            # Slightly higher temperature for diversity
+            topics_text = await self.batcher.submit(
+                prompt,
+                max_tokens=256,
+                temperature=0.7,
+                response_format={"type": "json_object"}
             )
             
-            # Process the response to extract topics
-            topics_text = response.choices[0].message.content
-            
-            # Parse bulleted list (lines starting with • or - or *)
-            topics = []
-            for line in topics_text.split('\n'):
-                line = line.strip()
-                if line.startswith('•') or line.startswith('-') or line.startswith('*'):
-                    # Remove the bullet point and trim
-                    topic = line[1:].strip()
-                    topics.append(topic)
+            topics = [
+                topic.strip()
+                for topic in json.loads(topics_text).get("topics", [])
+                if isinstance(topic, str) and topic.strip()
+            ]
             
             # Take only the requested number of topics
-            return topics[:max_topics]
+            topics = topics[:max_topics]
+            if topics:
+                self.cache.set(cache_key, topics)
+            return topics
             
         except Exception as e:
             print(f"Error extracting topics: {e}")
             traceback.print_exc(file=sys.stdout)
-            return ["Error extracting topics"]
+            raise
     
     def summarize_text(self, text: str) -> str:
         """Summarize the given text."""
+        return self.batcher.run(self.summarize_text_async(text))
+    
+    def summarize_texts(self, texts: List[str]) -> List[str]:
+        """Summarize several texts with their NIM calls running concurrently."""
+        return self.batcher.run(self.summarize_texts_async(texts))
+    
+    async def summarize_texts_async(self, texts: List[str]) -> List[str]:
+        """Summarize several texts concurrently without blocking the event loop."""
+        return list(await asyncio.gather(*[self.summarize_text_async(text) for text in texts]))
+    
+    async def summarize_text_async(self, text: str) -> str:
+        """Summarize the given text without blocking the event loop."""
         try:
             # Truncate text if it's too long
             if len(text) > MAX_CONTEXT_SIZE:
                 text = text[:MAX_CONTEXT_SIZE] + "..."
+            
+            cache_key = _digest("|".join([self.model_name, "summary", _digest(text)]))
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
                 
             prompt = f"""Summarize the following text in a concise manner:
             
@@ -141,19 +333,30 @@ class Gemma3LLM:
             
             Summary:"""
             
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-                max_tokens=512
-            )
-            
-            return response.choices[0].message.content
+            summary = await self.batcher.submit(prompt, max_tokens=512, temperature=0.3)
+            self.cache.set(cache_key, summary)
+            return summary
         except Exception as e:
             print(f"Error summarizing text: {e}")
             traceback.print_exc(file=sys.stdout)
             return "Failed to generate summary."
     
+    def _response_cache_key(self, query: str, context: str) -> str:
+        """Build the cache key for a query answered from the given context."""
+        return _digest("|".join([self.model_name, "response", query, _digest(context)]))
+    
+    def _response_prompt(self, query: str, context: str) -> str:
+        """Create a prompt for the RAG query."""
+        return f"""Answer the following question in detail about news from UK based on the provided context. 
+            If the question cannot be answered based on the context, simply state that you don't have enough information.
+            
+            Context:
+            {context}
+            
+            Question: {query}
+            
+            Answer:"""
+    
     def _format_documents(self, docs: List[Document]) -> str:
         """Format documents into a string context."""
         formatted_docs = []
@@ -170,54 +373,49 @@ class Gemma3LLM:
         
         return "\n".join(formatted_docs)
         
-    def _format_documents_with_limit(self, docs: List[Document], max_chars: int) -> str:
-        """Format documents into a string context with a maximum character limit."""
+    def _format_documents_with_limit(self, docs: List[Document], max_chars: int) -> Tuple[str, int]:
+        """
+        Format documents into a string context with a maximum character limit.
+        
+        Returns:
+            Tuple of (context, context length in characters)
+        """
         if not docs:
-            return "No documents available."
-            
-        # Determine how many chars we can use per document (approximately)
-        # Reserve some space for metadata per document
-        metadata_overhead = 150  # Approximate chars for metadata per doc
-        available_chars_per_doc = (max_chars // len(docs)) - metadata_overhead
+            context = "No documents available."
+            return context, len(context)
         
-        # If we have very few documents, we don't need to truncate as much
-        if available_chars_per_doc > 1000:
-            available_chars_per_doc = 1000  # Cap at 1000 chars per document to allow for more documents
-            
-        formatted_docs = []
+        headers = [
+            f"Document {i+1}:\nTitle: {doc.metadata.get('title', 'Untitled')}\n"
+            f"Source: {doc.metadata.get('source', 'Unknown')}\nDate: {doc.metadata.get('date', '')}\n"
+            f"URL: {doc.metadata.get('url', '')}\n\nContent: "
+            for i, doc in enumerate(docs)
+        ]
+        
+        # Per-document content budget, computed once from the actual header lengths
+        # (plus "..." and a separator each) so every document gets a share; capped
+        # at 1000 chars per document, and at least 100 so included content is useful
+        metadata_overhead = sum(len(header) + 5 for header in headers)
+        budget = max(100, min(1000, (max_chars - metadata_overhead) // len(docs)))
+        
+        parts = []
         total_length = 0
         
-        for i, doc in enumerate(docs):
-            if total_length >= max_chars:
-                break
-                
-            metadata = doc.metadata
-            source = metadata.get("source", "Unknown")
-            title = metadata.get("title", "Untitled")
-            url = metadata.get("url", "")
-            date = metadata.get("date", "")
-            
-            # Calculate metadata length
-            metadata_text = f"Document {i+1}:\nTitle: {title}\nSource: {source}\nDate: {date}\nURL: {url}\n\nContent: "
-            metadata_length = len(metadata_text)
-            
-            # Calculate available space for content
-            remaining_chars = max_chars - total_length - metadata_length
+        for doc, header in zip(docs, headers):
+            # Space left for this document's content, keeping room for "..." and the separator
+            remaining_chars = max_chars - total_length - len(header) - 5
             
-            # If not enough space for meaningful content, skip this document
+            # If not enough space for meaningful content, stop here
             if remaining_chars < 100:
                 break
-                
-            # Get content and truncate if necessary
+            
+            # Get content and truncate to the per-document budget or the space left, whichever is smaller
             content = doc.page_content
-            if len(content) > available_chars_per_doc:
-                content = content[:available_chars_per_doc] + "..."
-                
-            # Add formatted document
-            formatted_doc = metadata_text + content + "\n"
-            formatted_docs.append(formatted_doc)
+            limit = min(budget, remaining_chars)
+            if len(content) > limit:
+                content = content[:limit] + "..."
             
-            # Update total length
+            formatted_doc = f"{header}{content}\n\n"
+            parts.append(formatted_doc)
             total_length += len(formatted_doc)
-            
-        return "\n".join(formatted_docs) 
\ No newline at end of file
+        
+        return "".join(parts), total_length
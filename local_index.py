@@ -0,0 +1,103 @@
+import threading
+from typing import Any, Dict, List, Sequence, Set
+
+import faiss
+import numpy as np
+
+# HNSW graph parameters: neighbours per node, and candidates examined per search
+HNSW_M = 32
+HNSW_EF_SEARCH = 64
+
+class LocalIndex:
+    """
+    In-memory mirror of the Pinecone index for low-latency similarity search.
+    
+    Vectors are kept in a FAISS HNSW inner-product index alongside the
+    metadata stored with each one in Pinecone (including its text), so a
+    query is answered without a network round trip. Pinecone stays the
+    source of truth: the mirror is loaded from it at startup, updated with
+    every write made through this process, and reloaded when its size no
+    longer matches Pinecone's.
+    
+    Vectors are stored as 8-bit scalars, a quarter of the memory of float32
+    for the whole corpus. Components of L2-normalized vectors lie in [-1, 1],
+    so the quantizer is trained on that fixed range and needs no sample data.
+    
+    HNSW indexes can't remove vectors, so deleted vectors are only dropped
+    from the results, and re-adding a stored ID replaces its metadata but
+    keeps its original vector.
+    """
+    
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        # Set once the mirror holds everything in Pinecone; searches fall back to Pinecone until then
+        self.ready = False
+        
+        self._index = self._new_index()
+        self._metadata: List[Dict[str, Any]] = []
+        self._positions: Dict[str, int] = {}
+        self._deleted: Set[int] = set()
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._positions) - len(self._deleted)
+    
+    def add(self, ids: Sequence[str], embeddings: Sequence[Sequence[float]], metadatas: Sequence[Dict[str, Any]]) -> None:
+        """Add vectors with their metadata, replacing the metadata of IDs already stored."""
+        with self._lock:
+            new_vectors = []
+            for vector_id, embedding, metadata in zip(ids, embeddings, metadatas):
+                position = self._positions.get(vector_id)
+                if position is not None:
+                    self._metadata[position] = metadata
+                    self._deleted.discard(position)
+                    continue
+                
+                self._positions[vector_id] = len(self._metadata)
+                self._metadata.append(metadata)
+                new_vectors.append(embedding)
+            
+            if new_vectors:
+                self._index.add(self._normalize(new_vectors))
+    
+    def search(self, embedding: Sequence[float], k: int) -> List[Dict[str, Any]]:
+        """Return the metadata of up to k vectors most similar to the embedding, best first."""
+        with self._lock:
+            # Ask for extra results to make up for deleted vectors
+            top_k = min(k + len(self._deleted), self._index.ntotal)
+            if top_k == 0:
+                return []
+            
+            _, positions = self._index.search(self._normalize([embedding]), top_k)
+            results = [self._metadata[position] for position in positions[0] if position != -1 and position not in self._deleted]
+            return results[:k]
+    
+    def delete(self, ids: Sequence[str]) -> None:
+        """Drop vectors from search results."""
+        with self._lock:
+            for vector_id in ids:
+                position = self._positions.get(vector_id)
+                if position is not None:
+                    self._deleted.add(position)
+    
+    def clear(self) -> None:
+        """Remove all vectors."""
+        with self._lock:
+            self._index = self._new_index()
+            self._metadata.clear()
+            self._positions.clear()
+            self._deleted.clear()
+    
+    def _new_index(self) -> faiss.Index:
+        """Create an empty HNSW inner-product index over int8-quantized vectors."""
+        index = faiss.IndexHNSWSQ(self.dimension, faiss.ScalarQuantizer.QT_8bit_uniform, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.train(np.array([[-1.0] * self.dimension, [1.0] * self.dimension], dtype=np.float32))
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        return index
+    
+    @staticmethod
+    def _normalize(embeddings: Sequence[Sequence[float]]) -> np.ndarray:
+        """Return the embeddings as L2-normalized float32 rows."""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        faiss.normalize_L2(vectors)
+        return vectors
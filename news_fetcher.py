@@ -1,32 +1,81 @@
-import feedparser
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import re
+from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Dict, Any, Set
-import time
+from email.utils import parsedate_to_datetime
+from dateutil import parser as date_parser
+from typing import TYPE_CHECKING, List, Dict, Any, Iterable, Optional, Tuple, Union
 import random
 from config import RSS_FEEDS
 
+# Network and parsing libraries are imported where they are used, so importing
+# this module (e.g. on Streamlit cold start) does not pull them in
+if TYPE_CHECKING:
+    import aiohttp
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+# Maximum number of in-flight article requests per source
+MAX_CONCURRENT_PER_SOURCE = 2
+
+# Article requests failing with these statuses are retried, waiting
+# RETRY_BACKOFF * 2**attempt seconds between attempts
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 2
+RETRY_BACKOFF = 0.3
+
+# Feed-provided content longer than this is used instead of fetching the page
+MIN_FEED_CONTENT_LENGTH = 800
+
+# Matches any run of whitespace for normalization (str patterns include \u00a0 in \s)
+_WS_RE = re.compile(r"\s+")
+
+# Page furniture, tracking and share/newsletter widgets on BBC, Guardian and gov.uk pages
+_NOISE_SELECTORS = (
+    "script,style,header,footer,nav,aside,form,noscript,iframe,[aria-hidden='true'],"
+    ".ad,.advertisement,.newsletter,.related,.share,.cookie,[data-component='share-tools']"
+)
+
+@dataclass(slots=True)
 class NewsArticle:
-    def __init__(self, title: str, content: str, url: str, date: datetime, source: str):
-        self.title = title
-        self.content = content
-        self.url = url
-        self.date = date
-        self.source = source
-        
+    title: str
+    content: str
+    url: str
+    date: datetime
+    source: str
+    
     def to_dict(self) -> Dict[str, Any]:
         return {
             "title": self.title,
             "content": self.content,
             "url": self.url,
-            "date": self.date.isoformat() if isinstance(self.date, datetime) else self.date,
+            "date": self.date.isoformat(),
             "source": self.source
         }
 
-def fetch_rss_feed(feed_url: str, source_name: str) -> List[Dict]:
-    """Fetch articles from an RSS feed."""
-    feed = feedparser.parse(feed_url)
+def fetch_rss_feed(feed_url: str, source_name: str, validators: Optional[Dict[str, Optional[str]]] = None) -> Tuple[List[Dict], Dict[str, Optional[str]]]:
+    """
+    Fetch articles from an RSS feed.
+    
+    Uses a conditional GET with the feed's last ETag / Last-Modified values,
+    so an unchanged feed returns no entries without being downloaded again.
+    The caller stores the returned validators once the entries are safely
+    processed; they are not saved here.
+    
+    Returns:
+        Tuple of (entries, {"etag": ..., "modified": ...} for the next fetch)
+    """
+    import feedparser
+    
+    validators = validators or {}
+    feed = feedparser.parse(feed_url, etag=validators.get("etag"), modified=validators.get("modified"))
+    
+    if feed.get("status") == 304:
+        print(f"Feed unchanged since last refresh: {source_name}")
+        return [], validators
+    
     entries = []
     
     for entry in feed.entries:
@@ -34,115 +83,199 @@ def fetch_rss_feed(feed_url: str, source_name: str) -> List[Dict]:
             "title": entry.get("title", ""),
             "link": entry.get("link", ""),
             "published": entry.get("published", entry.get("pubDate", "")),
-            "source": source_name
+            "source": source_name,
+            # Full article body when the feed carries one (content:encoded / Atom content)
+            "content_html": entry.get("content", [{}])[0].get("value") or entry.get("summary", "")
         }
         entries.append(article)
     
-    return entries
+    return entries, {"etag": feed.get("etag"), "modified": feed.get("modified")}
 
 def parse_date(date_str: str) -> datetime:
     """Parse date string into datetime object."""
+    # RFC 822 dates, as used by most RSS feeds
     try:
-        # Try multiple date formats
-        formats = [
-            "%a, %d %b %Y %H:%M:%S %z",  # RFC 822 format often used in RSS
-            "%a, %d %b %Y %H:%M:%S %Z",
-            "%Y-%m-%dT%H:%M:%S%z",       # ISO format
-            "%Y-%m-%d %H:%M:%S",
-            "%Y-%m-%d"
-        ]
-        
-        for fmt in formats:
-            try:
-                return datetime.strptime(date_str, fmt)
-            except ValueError:
-                continue
-                
+        return parsedate_to_datetime(date_str)
+    except (TypeError, ValueError):
+        pass
+    
+    # Anything else (e.g. ISO 8601 in Atom feeds)
+    try:
+        return date_parser.parse(date_str)
+    except (TypeError, ValueError, OverflowError):
         # Default to current time if parsing fails
         return datetime.now()
-    except Exception:
-        return datetime.now()
 
-def fetch_article_content(url: str) -> str:
-    """Fetch and extract the main content from an article URL."""
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
+def _normalize_whitespace(text: str) -> str:
+    """Collapse every whitespace run (newlines, tabs, non-breaking spaces) to one space."""
+    return _WS_RE.sub(" ", text).strip()
+
+def extract_article_text(html: Union[str, bytes]) -> str:
+    """
+    Extract the main text content from an article's HTML.
+    
+    Raw response bytes are preferred: both parsers decode them natively, which
+    avoids a Python-side decode (and re-encode inside the parser) per article.
+    """
+    import trafilatura
+    from selectolax.lexbor import LexborHTMLParser
+    
+    # Main-article extraction drops comments, navigation and other boilerplate
+    text = trafilatura.extract(html, include_comments=False, include_tables=False)
+    if text:
+        return _normalize_whitespace(text)
+    
+    # Fall back to the whole page body with known noise elements removed
+    tree = LexborHTMLParser(html)
+    if tree.body is None:
+        return ""
+    
+    # Re-query after each removal so nested matches are never touched once freed
+    node = tree.css_first(_NOISE_SELECTORS)
+    while node is not None:
+        node.decompose()
+        node = tree.css_first(_NOISE_SELECTORS)
+    
+    return _normalize_whitespace(tree.body.text(separator=" ", strip=True))
+
+async def fetch_article_content_async(session: "aiohttp.ClientSession", url: str) -> str:
+    """
+    Fetch and extract the main content from an article URL using a shared session.
+    
+    Rate-limited and transient server errors (RETRY_STATUSES) are retried up
+    to MAX_RETRIES times with exponential backoff.
+    """
+    import aiohttp
     
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, "lxml")
-        
-        # Remove script and style elements
-        for script in soup(["script", "style", "header", "footer", "nav"]):
-            script.extract()
-        
-        # Get text content
-        text = soup.get_text(separator=" ", strip=True)
-        
-        # Normalize whitespace
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = " ".join(chunk for chunk in chunks if chunk)
+        for attempt in range(MAX_RETRIES + 1):
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                if response.status not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                    response.raise_for_status()
+                    html = await response.read()
+                    break
+            
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
         
-        return text
+        # Parsing is CPU-bound, so run it off the event loop to keep other downloads moving
+        return await asyncio.to_thread(extract_article_text, html)
     except Exception as e:
         print(f"Error fetching article content from {url}: {e}")
         return ""
 
-def get_all_news_articles(existing_urls: Set[str] = None) -> List[NewsArticle]:
+async def _fetch_entry(session: "aiohttp.ClientSession", semaphore: asyncio.Semaphore, entry: Dict) -> Optional[NewsArticle]:
+    """Fetch a single RSS entry's article, limited by its source's semaphore."""
+    content = ""
+    
+    # Use the body from the feed itself when it is substantial, skipping the page fetch
+    if len(entry["content_html"]) > MIN_FEED_CONTENT_LENGTH:
+        content = await asyncio.to_thread(extract_article_text, entry["content_html"])
+    
+    if not content:
+        async with semaphore:
+            # Add a small delay to be polite to the servers
+            await asyncio.sleep(random.uniform(1, 3))
+            content = await fetch_article_content_async(session, entry["link"])
+    
+    if not content:
+        return None
+    
+    return NewsArticle(
+        title=entry["title"],
+        content=content,
+        url=entry["link"],
+        date=parse_date(entry["published"]),
+        source=entry["source"]
+    )
+
+async def get_all_news_articles_async(
+    existing_urls: Iterable[str] = None,
+    feed_validators: Optional[Dict[str, Dict[str, Optional[str]]]] = None
+) -> Tuple[List[NewsArticle], Dict[str, Dict[str, Optional[str]]]]:
     """
-    Fetch and process news articles from all configured RSS feeds.
+    Fetch and process news articles from all configured RSS feeds concurrently.
+    
+    Feeds are parsed in the default executor (feedparser is synchronous) and
+    article pages are fetched over a shared connection pool, with at most
+    MAX_CONCURRENT_PER_SOURCE requests in flight per source.
     
     Args:
-        existing_urls: Set of URLs that are already in the database
+        existing_urls: URLs that are already in the database
+        feed_validators: ETag / Last-Modified values from the last stored fetch, by feed URL
         
     Returns:
-        List of new NewsArticle objects
+        Tuple of (new NewsArticle objects, validators to store for each feed
+        read successfully once the articles are stored)
     """
-    all_articles = []
-    existing_urls = existing_urls or set()
+    import aiohttp
+    
+    # Guarantee O(1) membership checks whatever collection the caller passes
+    existing_urls = frozenset(existing_urls or ())
+    loop = asyncio.get_running_loop()
     
-    for source_name, feed_url in RSS_FEEDS.items():
-        try:
-            print(f"Fetching articles from {source_name}...")
-            entries = fetch_rss_feed(feed_url, source_name)
+    sources = list(RSS_FEEDS.items())
+    print(f"Fetching articles from {', '.join(name for name, _ in sources)}...")
+    feed_validators = feed_validators or {}
+    feed_results = await asyncio.gather(
+        *[
+            loop.run_in_executor(None, fetch_rss_feed, feed_url, source_name, feed_validators.get(feed_url))
+            for source_name, feed_url in sources
+        ],
+        return_exceptions=True
+    )
+    
+    new_validators = {}
+    
+    connector = aiohttp.TCPConnector(limit_per_host=MAX_CONCURRENT_PER_SOURCE)
+    async with aiohttp.ClientSession(connector=connector, headers=HEADERS) as session:
+        tasks = []
+        for (source_name, feed_url), feed_result in zip(sources, feed_results):
+            if isinstance(feed_result, Exception):
+                print(f"Error processing feed {source_name}: {feed_result}")
+                continue
+            
+            entries, validators = feed_result
+            if validators.get("etag") or validators.get("modified"):
+                new_validators[feed_url] = validators
             
-            for entry in entries:
-                url = entry["link"]
-                
-                # Skip if this URL already exists in the database
-                if url in existing_urls:
-                    print(f"Skipping already indexed article: {entry['title']}")
-                    continue
-                
-                # Add a small delay to be polite to the servers
-                time.sleep(random.uniform(1, 3))
-                
-                content = fetch_article_content(url)
-                date = parse_date(entry["published"])
-                
-                if content:
-                    article = NewsArticle(
-                        title=entry["title"],
-                        content=content,
-                        url=url,
-                        date=date,
-                        source=source_name
-                    )
-                    all_articles.append(article)
-                    
-        except Exception as e:
-            print(f"Error processing feed {source_name}: {e}")
+            # Skip URLs that already exist in the database
+            new_entries = [entry for entry in entries if entry["link"] not in existing_urls]
+            print(f"{source_name}: {len(new_entries)} new, {len(entries) - len(new_entries)} already indexed")
+            
+            semaphore = asyncio.Semaphore(MAX_CONCURRENT_PER_SOURCE)
+            tasks.extend(_fetch_entry(session, semaphore, entry) for entry in new_entries)
+        
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    
+    all_articles = []
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"Error processing article: {result}")
+        elif result is not None:
+            all_articles.append(result)
     
     print(f"Fetched {len(all_articles)} new articles")
-    return all_articles
+    return all_articles, new_validators
+
+def get_all_news_articles(
+    existing_urls: Iterable[str] = None,
+    feed_validators: Optional[Dict[str, Dict[str, Optional[str]]]] = None
+) -> Tuple[List[NewsArticle], Dict[str, Dict[str, Optional[str]]]]:
+    """
+    Fetch and process news articles from all configured RSS feeds.
+    
+    Args:
+        existing_urls: URLs that are already in the database
+        feed_validators: ETag / Last-Modified values from the last stored fetch, by feed URL
+        
+    Returns:
+        Tuple of (new NewsArticle objects, validators to store for each feed)
+    """
+    return asyncio.run(get_all_news_articles_async(existing_urls, feed_validators))
 
 if __name__ == "__main__":
     # Test the module
-    articles = get_all_news_articles()
+    articles, _ = get_all_news_articles()
     print(f"Fetched {len(articles)} articles")
     for i, article in enumerate(articles[:3]):
         print(f"\nArticle {i+1}:")
@@ -1,16 +1,30 @@
+import asyncio
 import os
 import sys
-from typing import List, Optional, Dict, Any, Set
+from typing import List, Optional, Dict, Any, Iterator, Set, Tuple
 import traceback
+from functools import lru_cache
+from itertools import zip_longest
+from concurrent.futures import ThreadPoolExecutor
 
-from news_fetcher import get_all_news_articles, NewsArticle
-from vector_store import VectorStore, documents_from_articles
+from news_fetcher import get_all_news_articles_async, NewsArticle
+from vector_store import VectorStore, EMBEDDING_DIMENSION
 from llm_model import Gemma3LLM
-from config import PINECONE_API_KEY, NVIDIA_NIM_API_KEY
+from url_index import load_existing_urls, record_urls, clear_urls, load_feed_validators, record_feed_validators, clear_feed_validators
+from semantic_cache import SemanticCache
+from config import PINECONE_API_KEY, NVIDIA_NIM_API_KEY, RAG_SERVER_URL
+
+# Documents retrieved per query by default; the semantic cache only holds answers built from this many
+DEFAULT_NUM_RESULTS = 3
 
 class UKPolicyRAG:
-    def __init__(self):
-        """Initialize the UK Policy RAG system."""
+    def __init__(self, llm: Optional[Gemma3LLM] = None):
+        """
+        Initialize the UK Policy RAG system.
+        
+        Args:
+            llm: Existing LLM client to reuse; a new one is created if omitted
+        """
         print("Checking API keys...")
         # Check for required API keys
         if not PINECONE_API_KEY:
@@ -33,13 +47,16 @@ class UKPolicyRAG:
         
         print("Initializing LLM...")
         try:
-            self.llm = Gemma3LLM()
+            self.llm = llm or Gemma3LLM()
             print("LLM initialized successfully.")
         except Exception as e:
             print(f"Error initializing LLM: {e}")
             traceback.print_exc()
             raise
         
+        # Answers to recent near-duplicate questions
+        self.semantic_cache = SemanticCache(dimension=EMBEDDING_DIMENSION)
+        
         print("UK Policy RAG system initialized successfully.")
     
     def fetch_and_store_articles(self) -> int:
@@ -47,26 +64,44 @@ class UKPolicyRAG:
         Step 1: Fetch articles from RSS feeds and store them in the vector store.
         This function deduplicates based on article URLs.
         
+        Returns:
+            Number of new articles added to the database
+        """
+        return asyncio.run(self.fetch_and_store_articles_async())
+    
+    async def fetch_and_store_articles_async(self) -> int:
+        """
+        Fetch and store new articles on a single event loop.
+        
+        Article downloads and Pinecone upserts are both asynchronous, so each
+        stage overlaps its network requests instead of waiting on them in turn.
+        
         Returns:
             Number of new articles added to the database
         """
         print("Fetching news articles...")
         
-        # Get existing article URLs to avoid duplicates
-        existing_urls = self.vector_store.get_all_document_urls()
+        # Get existing article URLs from the local record to avoid duplicates
+        # (SQLite calls run in worker threads so the event loop, possibly the server's, keeps serving)
+        existing_urls = await asyncio.to_thread(load_existing_urls)
+        if not existing_urls:
+            # Seed the local record from the vector store on first use
+            existing_urls = frozenset(await asyncio.to_thread(self.vector_store.get_all_document_urls))
+            await asyncio.to_thread(record_urls, [(url, "") for url in existing_urls])
         
-        # Fetch new articles, skipping ones we already have
-        articles = get_all_news_articles(existing_urls)
+        # Fetch new articles, skipping ones we already have and feeds unchanged since the last stored fetch
+        feed_validators = await asyncio.to_thread(load_feed_validators)
+        articles, feed_validators = await get_all_news_articles_async(existing_urls, feed_validators)
         
-        if not articles:
+        if articles:
+            print(f"Adding {len(articles)} new articles to vector store...")
+            await self.vector_store.add_articles_async(articles)
+            await asyncio.to_thread(record_urls, [(article.url, article.source) for article in articles])
+        else:
             print("No new articles found.")
-            return 0
-        
-        print(f"Converting {len(articles)} new articles to documents...")
-        documents = documents_from_articles(articles)
         
-        print("Adding documents to vector store...")
-        self.vector_store.add_documents(documents)
+        # Only now are the feeds' articles stored, so later fetches may skip them while unchanged
+        await asyncio.to_thread(record_feed_validators, feed_validators)
         
         return len(articles)
     
@@ -76,39 +111,67 @@ class UKPolicyRAG:
         
         Returns:
             List of topic strings
+            
+        Raises:
+            LookupError: If no stored articles could be retrieved
         """
         print("Retrieving latest articles for topic extraction...")
         
-        # Get latest articles from BBC and Guardian
-        bbc_docs = self.vector_store.get_documents_by_source("bbc", limit=7)
-        guardian_docs = self.vector_store.get_documents_by_source("guardian", limit=7)
+        # Get latest articles from BBC and Guardian, querying both concurrently
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            bbc_docs, guardian_docs = executor.map(
+                lambda source: self.vector_store.get_documents_by_source(source, limit=7),
+                ["bbc", "guardian"]
+            )
         
-        # Combine documents
-        sample_docs = bbc_docs + guardian_docs
+        # Interleave the sources, so if the context limit cuts the tail both lose equally
+        sample_docs = [doc for pair in zip_longest(bbc_docs, guardian_docs) for doc in pair if doc is not None]
         
         if not sample_docs:
-            return ["No documents available for topic extraction"]
+            raise LookupError("No documents available for topic extraction")
         
         print(f"Extracting topics from {len(sample_docs)} latest documents ({len(bbc_docs)} BBC, {len(guardian_docs)} Guardian)")
         topics = self.llm.extract_topics(sample_docs, max_topics=10)
         
         return topics
     
-    def query(self, query_text: str, num_results: int = 3) -> Dict[str, Any]:
+    def index_stats(self) -> str:
+        """
+        Return a cheap fingerprint of the stored article set.
+        
+        Returns:
+            String of the form "<total vector count>:<latest article date>"
+        """
+        stats = self.vector_store.db_stats()
+        total_vector_count = getattr(stats, "total_vector_count", 0)
+        return f"{total_vector_count}:{self.vector_store.latest_date}"
+    
+    def query(self, query_text: str, num_results: int = DEFAULT_NUM_RESULTS, no_cache: bool = False) -> Dict[str, Any]:
         """
         Step 3: Process a user query using the RAG system.
         
         Args:
             query_text: The query to process
             num_results: Number of documents to retrieve
+            no_cache: Skip the semantic cache and always retrieve and generate
+                (it is also skipped when num_results differs from DEFAULT_NUM_RESULTS)
             
         Returns:
             Dict containing the query, sources, and generated response
         """
         print(f"Processing query: {query_text}")
         
+        # Serve near-duplicate questions from the semantic cache
+        query_embedding = self.vector_store.embedding_model.embed_query(query_text)
+        use_cache = not no_cache and num_results == DEFAULT_NUM_RESULTS
+        if use_cache:
+            cached = self.semantic_cache.get(query_embedding)
+            if cached is not None:
+                print("Semantic cache hit")
+                return {**cached, "query": query_text}
+        
         # Retrieve relevant documents
-        docs = self.vector_store.similar_search(query_text, k=num_results)
+        docs = self.vector_store.similar_search_by_vector(query_embedding, k=num_results)
         
         if not docs:
             return {
@@ -117,10 +180,100 @@ class UKPolicyRAG:
                 "response": "No relevant information found. Please try a different query."
             }
         
+        sources = self._format_sources(docs)
+        
         # Generate response
-        response = self.llm.generate_response(query_text, docs)
+        try:
+            response = self.llm.generate_response(query_text, docs)
+        except Exception as e:
+            # Reported to this caller only, never cached
+            return {
+                "query": query_text,
+                "sources": sources,
+                "response": f"Sorry, I encountered an error with the NIM API: {e}"
+            }
+        
+        # Return the complete result
+        result = {
+            "query": query_text,
+            "sources": sources,
+            "response": response
+        }
+        if use_cache:
+            self.semantic_cache.put(query_embedding, result)
+        return result
+    
+    def query_stream(self, query_text: str, num_results: int = DEFAULT_NUM_RESULTS, no_cache: bool = False) -> Tuple[List[Dict[str, Any]], Iterator[str]]:
+        """
+        Process a user query, streaming the generated response.
+        
+        Retrieval happens before returning, so the sources are available while
+        the response is still being generated.
         
-        # Format source information
+        Args:
+            query_text: The query to process
+            num_results: Number of documents to retrieve
+            no_cache: Skip the semantic cache and always retrieve and generate
+                (it is also skipped when num_results differs from DEFAULT_NUM_RESULTS)
+            
+        Returns:
+            Tuple of (sources, iterator over response text chunks)
+        """
+        print(f"Processing query: {query_text}")
+        
+        # Serve near-duplicate questions from the semantic cache
+        query_embedding = self.vector_store.embedding_model.embed_query(query_text)
+        use_cache = not no_cache and num_results == DEFAULT_NUM_RESULTS
+        if use_cache:
+            cached = self.semantic_cache.get(query_embedding)
+            if cached is not None:
+                print("Semantic cache hit")
+                return cached["sources"], iter([cached["response"]])
+        
+        # Retrieve relevant documents
+        docs = self.vector_store.similar_search_by_vector(query_embedding, k=num_results)
+        
+        if not docs:
+            return [], iter(["No relevant information found. Please try a different query."])
+        
+        sources = self._format_sources(docs)
+        
+        def stream() -> Iterator[str]:
+            # Cache the full response once the stream completes successfully
+            parts = []
+            try:
+                for chunk in self.llm.generate_response_stream(query_text, docs):
+                    parts.append(chunk)
+                    yield chunk
+            except Exception as e:
+                yield f"Sorry, I encountered an error with the NIM API: {e}"
+                return
+            
+            if use_cache:
+                self.semantic_cache.put(query_embedding, {"query": query_text, "sources": sources, "response": "".join(parts)})
+        
+        return sources, stream()
+    
+    def query_events(self, query_text: str, num_results: int = DEFAULT_NUM_RESULTS, no_cache: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Process a user query as a stream of events.
+        
+        Yields {"chunk": text} events as the response is generated, followed by
+        a final {"sources": [...]} event.
+        
+        Args:
+            query_text: The query to process
+            num_results: Number of documents to retrieve
+            no_cache: Skip the semantic cache and always retrieve and generate
+                (it is also skipped when num_results differs from DEFAULT_NUM_RESULTS)
+        """
+        sources, response_stream = self.query_stream(query_text, num_results=num_results, no_cache=no_cache)
+        for chunk in response_stream:
+            yield {"chunk": chunk}
+        yield {"sources": sources}
+    
+    def _format_sources(self, docs: List[Any]) -> List[Dict[str, Any]]:
+        """Format source information for the retrieved documents."""
         sources = []
         for doc in docs:
             source_info = {
@@ -131,23 +284,47 @@ class UKPolicyRAG:
             }
             sources.append(source_info)
         
-        # Return the complete result
-        return {
-            "query": query_text,
-            "sources": sources,
-            "response": response
-        }
+        return sources
     
     def clear_database(self) -> None:
         """Clear all documents from the vector store."""
         self.vector_store.clear_vector_store()
+        clear_urls()
+        clear_feed_validators()
+        self.semantic_cache.clear()
         print("Vector store cleared successfully.")
 
+@lru_cache(maxsize=1)
+def get_shared_rag() -> UKPolicyRAG:
+    """Return a RAG system shared by the standalone functions in this process."""
+    return UKPolicyRAG()
+
+def _server_request(method: str, path: str, **kwargs) -> Optional[Any]:
+    """
+    Send a request to a running RAG server (see server.py).
+    
+    Returns the decoded JSON response, or None if no server is reachable, in
+    which case the caller runs the step in this process instead.
+    """
+    import httpx
+    
+    try:
+        response = httpx.request(method, f"{RAG_SERVER_URL}{path}", **kwargs)
+    except httpx.ConnectError:
+        return None
+    
+    response.raise_for_status()
+    return response.json()
+
 def fetch_news():
     """Step 1: Standalone function to fetch and store news articles."""
     try:
-        rag = UKPolicyRAG()
-        num_articles = rag.fetch_and_store_articles()
+        # Fetching can take minutes, so don't time out waiting for the server
+        response = _server_request("POST", "/fetch", timeout=None)
+        if response is not None:
+            num_articles = response["added"]
+        else:
+            num_articles = get_shared_rag().fetch_and_store_articles()
         print(f"Added {num_articles} new articles to the vector store.")
         return True
     except Exception as e:
@@ -158,8 +335,11 @@ def fetch_news():
 def get_available_topics():
     """Step 2: Standalone function to extract and display topics."""
     try:
-        rag = UKPolicyRAG()
-        topics = rag.get_topics()
+        response = _server_request("GET", "/topics", timeout=120)
+        if response is not None:
+            topics = response["topics"]
+        else:
+            topics = get_shared_rag().get_topics()
         
         print("\n===== AVAILABLE TOPICS =====")
         for i, topic in enumerate(topics):
@@ -167,6 +347,9 @@ def get_available_topics():
         print("===========================\n")
         
         return topics
+    except LookupError as e:
+        print(e)
+        return []
     except Exception as e:
         print(f"Error getting topics: {e}")
         traceback.print_exc()
@@ -175,8 +358,9 @@ def get_available_topics():
 def answer_query(query_text: str):
     """Step 3: Standalone function to answer a user query."""
     try:
-        rag = UKPolicyRAG()
-        result = rag.query(query_text)
+        result = _server_request("GET", "/query", params={"q": query_text}, timeout=120)
+        if result is None:
+            result = get_shared_rag().query(query_text)
         
         print("\n" + "=" * 50)
         print(f"Query: {query_text}")
@@ -216,17 +400,24 @@ def main():
             query = " ".join(sys.argv[2:])
             answer_query(query)
         
+        elif command == "serve":
+            # Keep the models and caches loaded for the other commands
+            from server import serve
+            serve()
+        
         else:
             print("Usage:")
             print("  python rag_system.py fetch            # Fetch and store news articles")
             print("  python rag_system.py topics           # List available topics")
             print("  python rag_system.py query <query>    # Answer a specific query")
+            print("  python rag_system.py serve            # Run the RAG server used by the commands above")
     
     else:
         print("Usage:")
         print("  python rag_system.py fetch            # Fetch and store news articles")
         print("  python rag_system.py topics           # List available topics")
         print("  python rag_system.py query <query>    # Answer a specific query")
+        print("  python rag_system.py serve            # Run the RAG server used by the commands above")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
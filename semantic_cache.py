@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import faiss
+import numpy as np
+
+class LSHCache:
+    """
+    Random-projection LSH table of normalized vectors, keyed by entry ID.
+    
+    Each of the hash tables maps a vector to a signature of `bits` bits: the
+    signs of its projections onto random hyperplanes. Vectors with a high
+    cosine similarity are likely to share a signature in at least one table,
+    so a lookup only computes similarities for vectors sharing a bucket.
+    """
+    
+    def __init__(self, dimension: int, tables: int = 8, bits: int = 8, seed: int = 0):
+        self.tables = tables
+        self.bits = bits
+        
+        self._planes = np.random.default_rng(seed).standard_normal((dimension, tables * bits)).astype(np.float32)
+        self._buckets: List[Dict[bytes, Set[int]]] = [{} for _ in range(tables)]
+        # Entry ID -> (vector, signature in each table)
+        self._vectors: Dict[int, Tuple[np.ndarray, List[bytes]]] = {}
+    
+    def add(self, entry_id: int, vector: np.ndarray) -> None:
+        """Add a normalized vector under an entry ID."""
+        vector = vector.reshape(-1)
+        signatures = self._signatures(vector)
+        for buckets, signature in zip(self._buckets, signatures):
+            buckets.setdefault(signature, set()).add(entry_id)
+        self._vectors[entry_id] = (vector, signatures)
+    
+    def remove(self, entry_id: int) -> None:
+        """Remove an entry, if present."""
+        if entry_id not in self._vectors:
+            return
+        
+        _, signatures = self._vectors.pop(entry_id)
+        for buckets, signature in zip(self._buckets, signatures):
+            bucket = buckets[signature]
+            bucket.discard(entry_id)
+            if not bucket:
+                del buckets[signature]
+    
+    def clear(self) -> None:
+        """Remove all entries."""
+        for buckets in self._buckets:
+            buckets.clear()
+        self._vectors.clear()
+    
+    def search(self, vector: np.ndarray) -> Tuple[Optional[int], float]:
+        """
+        Return the ID and cosine similarity of the closest entry sharing a bucket with the vector.
+        
+        Returns (None, 0.0) when no entry shares a bucket.
+        """
+        vector = vector.reshape(-1)
+        candidates: Set[int] = set()
+        for buckets, signature in zip(self._buckets, self._signatures(vector)):
+            candidates.update(buckets.get(signature, ()))
+        
+        best_id, best_score = None, 0.0
+        for entry_id in candidates:
+            score = float(np.dot(self._vectors[entry_id][0], vector))
+            if best_id is None or score > best_score:
+                best_id, best_score = entry_id, score
+        return best_id, best_score
+    
+    def _signatures(self, vector: np.ndarray) -> List[bytes]:
+        """Hash a vector to one signature per table."""
+        signs = (vector @ self._planes > 0).reshape(self.tables, self.bits)
+        return [row.tobytes() for row in np.packbits(signs, axis=1)]
+
+class SemanticCache:
+    """
+    Cache of query results keyed by query embedding.
+    
+    Embeddings are L2-normalized and searched with a FAISS inner-product index,
+    so scores are cosine similarities. A lookup hits when the closest cached
+    query scores above the threshold. Entries expire after ttl seconds, and the
+    least recently used entry is evicted once max_entries is reached.
+    
+    An LSH table sits in front of the FAISS index. A query sharing no bucket
+    with any cached query is a miss without searching the index, and one whose
+    bucket holds a near-repeat (above lsh_threshold) is a hit without it; only
+    the cases in between are searched.
+    """
+    
+    def __init__(self, dimension: int, threshold: float = 0.87, ttl: float = 300, max_entries: int = 1000, lsh_threshold: float = 0.95):
+        self.dimension = dimension
+        self.threshold = threshold
+        self.lsh_threshold = lsh_threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        
+        self._index = faiss.IndexIDMap(faiss.IndexFlatIP(dimension))
+        self._lsh = LSHCache(dimension)
+        # Entry ID -> (creation time, result), kept in least-recently-used order
+        self._entries: "OrderedDict[int, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+    
+    def get(self, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """Return the cached result for the most similar query, if similar enough."""
+        vector = self._normalize(embedding)
+        
+        with self._lock:
+            if not self._entries:
+                return None
+            
+            entry_id, score = self._lsh.search(vector)
+            if entry_id is None:
+                return None
+            
+            if score < self.lsh_threshold:
+                # Similar but not a near-repeat: check against the looser threshold
+                scores, ids = self._index.search(vector, 1)
+                entry_id = int(ids[0][0])
+                if entry_id == -1 or scores[0][0] < self.threshold:
+                    return None
+            
+            created, result = self._entries[entry_id]
+            if time.monotonic() - created > self.ttl:
+                self._remove([entry_id])
+                return None
+            
+            self._entries.move_to_end(entry_id)
+            return result
+    
+    def put(self, embedding: List[float], result: Dict[str, Any]) -> None:
+        """Cache a result under its query embedding."""
+        vector = self._normalize(embedding)
+        
+        with self._lock:
+            # Drop expired entries, then least recently used ones while full
+            now = time.monotonic()
+            self._remove([entry_id for entry_id, (created, _) in self._entries.items() if now - created > self.ttl])
+            if len(self._entries) >= self.max_entries:
+                self._remove(list(self._entries)[:len(self._entries) - self.max_entries + 1])
+            
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._lsh.add(entry_id, vector)
+            self._entries[entry_id] = (now, result)
+    
+    def clear(self) -> None:
+        """Remove all cached entries."""
+        with self._lock:
+            self._index.reset()
+            self._lsh.clear()
+            self._entries.clear()
+    
+    def _remove(self, entry_ids: List[int]) -> None:
+        """Remove entries from the index and the entry table (lock must be held)."""
+        if not entry_ids:
+            return
+        
+        self._index.remove_ids(np.array(entry_ids, dtype=np.int64))
+        for entry_id in entry_ids:
+            self._lsh.remove(entry_id)
+            del self._entries[entry_id]
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        """Return the embedding as an L2-normalized float32 row vector."""
+        vector = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(vector)
+        return vector
@@ -0,0 +1,49 @@
+import orjson
+import uvicorn
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from typing import List, Dict, Any, AsyncIterator
+
+from rag_system import get_shared_rag, DEFAULT_NUM_RESULTS
+from config import RAG_SERVER_HOST, RAG_SERVER_PORT
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Load the RAG system before serving, so the first request doesn't pay for it."""
+    get_shared_rag()
+    yield
+
+app = FastAPI(title="UK Policy News RAG", lifespan=lifespan, default_response_class=ORJSONResponse)
+
+@app.post("/fetch")
+async def fetch() -> Dict[str, int]:
+    """Fetch new articles and store them in the vector store."""
+    return {"added": await get_shared_rag().fetch_and_store_articles_async()}
+
+@app.get("/topics")
+def topics() -> Dict[str, List[str]]:
+    """Extract topics from the latest stored articles."""
+    try:
+        return {"topics": get_shared_rag().get_topics()}
+    except LookupError as e:
+        # Nothing stored yet: report it in place of the topics
+        return {"topics": [str(e)]}
+
+@app.get("/query")
+def query(q: str, num_results: int = DEFAULT_NUM_RESULTS) -> Dict[str, Any]:
+    """Answer a query from the stored articles."""
+    return get_shared_rag().query(q, num_results=num_results)
+
+@app.get("/query/stream")
+def query_stream(q: str, num_results: int = DEFAULT_NUM_RESULTS) -> StreamingResponse:
+    """Answer a query as server-sent events, sending the response as it is generated."""
+    events = get_shared_rag().query_events(q, num_results=num_results)
+    return StreamingResponse((b"data: " + orjson.dumps(event) + b"\n\n" for event in events), media_type="text/event-stream")
+
+def serve() -> None:
+    """Run the server in this process until interrupted."""
+    uvicorn.run(app, host=RAG_SERVER_HOST, port=RAG_SERVER_PORT)
+
+if __name__ == "__main__":
+    serve()
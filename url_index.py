@@ -0,0 +1,70 @@
+import sqlite3
+import time
+from contextlib import closing
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+from config import PINECONE_INDEX_NAME
+
+# Local record of article URLs already stored in the vector store, and of the feed
+# validators from the last fetch whose articles were all stored (one per index, so
+# switching to a new index does not skip articles stored only in the old one)
+URL_DB_PATH = f"urls-{PINECONE_INDEX_NAME}.db"
+
+def _connect() -> sqlite3.Connection:
+    """Open the URL database, creating the tables on first use."""
+    conn = sqlite3.connect(URL_DB_PATH)
+    # The PRIMARY KEY gives url its own index, so lookups need no extra one
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS indexed_urls(url TEXT PRIMARY KEY, source TEXT, indexed_at INTEGER)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS feed_validators(feed_url TEXT PRIMARY KEY, etag TEXT, modified TEXT)"
+    )
+    return conn
+
+def load_existing_urls() -> FrozenSet[str]:
+    """Return the URLs of all articles recorded as indexed."""
+    with closing(_connect()) as conn:
+        return frozenset(row[0] for row in conn.execute("SELECT url FROM indexed_urls"))
+
+def record_urls(entries: Iterable[Tuple[str, str]]) -> None:
+    """
+    Record articles as indexed.
+    
+    Args:
+        entries: (url, source) pairs for articles stored in the vector store
+    """
+    indexed_at = int(time.time())
+    rows = [(url, source, indexed_at) for url, source in entries]
+    
+    with closing(_connect()) as conn, conn:
+        conn.executemany("INSERT OR IGNORE INTO indexed_urls VALUES (?, ?, ?)", rows)
+
+def clear_urls() -> None:
+    """Forget all recorded URLs."""
+    with closing(_connect()) as conn, conn:
+        conn.execute("DELETE FROM indexed_urls")
+
+def load_feed_validators() -> Dict[str, Dict[str, Optional[str]]]:
+    """Return the stored ETag / Last-Modified values, by feed URL."""
+    with closing(_connect()) as conn:
+        return {
+            feed_url: {"etag": etag, "modified": modified}
+            for feed_url, etag, modified in conn.execute("SELECT feed_url, etag, modified FROM feed_validators")
+        }
+
+def record_feed_validators(validators: Dict[str, Dict[str, Optional[str]]]) -> None:
+    """
+    Store feed validators for the next conditional fetch.
+    
+    Only call this once the articles from those feeds are stored, or an
+    unchanged feed will hide articles that never made it into the index.
+    """
+    rows = [(feed_url, values.get("etag"), values.get("modified")) for feed_url, values in validators.items()]
+    
+    with closing(_connect()) as conn, conn:
+        conn.executemany("INSERT OR REPLACE INTO feed_validators VALUES (?, ?, ?)", rows)
+
+def clear_feed_validators() -> None:
+    """Forget all feed validators, so the next fetch reads every feed in full."""
+    with closing(_connect()) as conn, conn:
+        conn.execute("DELETE FROM feed_validators")
@@ -1,11 +1,81 @@
-from typing import List, Dict, Any, Optional, Set
+from typing import List, Dict, Any, Optional, Set, Iterable, Tuple
 from pinecone import Pinecone
-from langchain_pinecone import PineconeVectorStore
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain.schema.document import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from local_index import LocalIndex
 from config import PINECONE_API_KEY, PINECONE_ENVIRONMENT, PINECONE_INDEX_NAME
 from datetime import datetime
+from functools import lru_cache
+import asyncio
+import hashlib
+import heapq
 import os
+import threading
+import time
+
+# Sentence-transformers model used to embed articles and queries
+# (the Pinecone index must be created with the same dimension)
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_DIMENSION = 384
+
+# Embeddings are L2-normalized, so a dot product equals their cosine similarity
+INDEX_METRIC = "dotproduct"
+
+# Documents embedded per forward pass (on CPU, and on GPU where memory allows more)
+EMBEDDING_BATCH_SIZE = 64
+GPU_EMBEDDING_BATCH_SIZE = 128
+
+# Articles are split into overlapping chunks of this many characters, embedded separately
+CHUNK_SIZE = 400
+CHUNK_OVERLAP = 50
+
+# Chunks retrieved per requested article, so k distinct articles survive deduplication
+CHUNK_OVERFETCH = 4
+
+# Maximum number of vectors per Pinecone upsert request
+UPSERT_BATCH_SIZE = 100
+
+# Seconds between checks that the local index still matches Pinecone's vector count
+LOCAL_INDEX_CHECK_INTERVAL = 60
+
+# Pooled connections the Pinecone client keeps for queries made concurrently from several threads
+PINECONE_POOL_THREADS = 16
+
+@lru_cache(maxsize=1)
+def _get_pinecone_client() -> Pinecone:
+    """Create the Pinecone client once per process."""
+    return Pinecone(api_key=PINECONE_API_KEY, pool_threads=PINECONE_POOL_THREADS)
+
+@lru_cache(maxsize=1)
+def _get_text_splitter() -> RecursiveCharacterTextSplitter:
+    """Create the article splitter once per process."""
+    return RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+@lru_cache(maxsize=1)
+def _get_embedding_model() -> HuggingFaceEmbeddings:
+    """
+    Load the embedding model once per process.
+    
+    Runs in half precision on a CUDA GPU when one is available, otherwise on
+    the CPU using every core.
+    """
+    import torch
+    
+    if torch.cuda.is_available():
+        model_kwargs = {"device": "cuda", "model_kwargs": {"torch_dtype": torch.float16}}
+        batch_size = GPU_EMBEDDING_BATCH_SIZE
+    else:
+        torch.set_num_threads(os.cpu_count() or 1)
+        model_kwargs = {"device": "cpu"}
+        batch_size = EMBEDDING_BATCH_SIZE
+    
+    print(f"Loading embedding model on {model_kwargs['device']}")
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL,
+        model_kwargs=model_kwargs,
+        encode_kwargs={"batch_size": batch_size, "normalize_embeddings": True}
+    )
 
 class VectorStore:
     def __init__(self):
@@ -14,42 +84,153 @@ class VectorStore:
         self.pinecone_environment = PINECONE_ENVIRONMENT
         self.index_name = PINECONE_INDEX_NAME
         
-        # Initialize Pinecone with the new client format
-        self.pc = Pinecone(api_key=self.pinecone_api_key)
+        # Shared Pinecone client (reused across VectorStore instances)
+        self.pc = _get_pinecone_client()
         
         # Check if the index exists by listing all indexes
         try:
             index_list = self.pc.list_indexes()
-            available_indexes = [idx["name"] for idx in index_list]
+            available_indexes = {idx["name"]: idx for idx in index_list}
             
             if self.index_name not in available_indexes:
                 print(f"Warning: Index '{self.index_name}' not found in Pinecone. Please ensure it's created.")
+            elif available_indexes[self.index_name]["dimension"] != EMBEDDING_DIMENSION:
+                print(f"Warning: Index '{self.index_name}' has dimension {available_indexes[self.index_name]['dimension']}, "
+                      f"but {EMBEDDING_MODEL} produces {EMBEDDING_DIMENSION}. Create a new index and re-fetch articles.")
+            elif available_indexes[self.index_name]["metric"] != INDEX_METRIC:
+                print(f"Warning: Index '{self.index_name}' uses the {available_indexes[self.index_name]['metric']} metric. "
+                      f"Embeddings are normalized, so an index created with the {INDEX_METRIC} metric gives the same ranking for less work.")
         except Exception as e:
             print(f"Error checking indexes: {e}")
             
-        # Initialize embedding model (using MPNET as a default good model)
-        self.embedding_model = HuggingFaceEmbeddings(
-            model_name="all-mpnet-base-v2"
-        )
-        
-        # Get the index
-        self.index = self.pc.Index(self.index_name)
-        
-        # Initialize vector store with the updated PineconeVectorStore
-        self.vector_store = PineconeVectorStore(
-            index_name=self.index_name,
-            embedding=self.embedding_model,
-            text_key="text",
-            pinecone_api_key=self.pinecone_api_key
-        )
-    
-    def add_documents(self, docs: List[Document]) -> None:
-        """Add documents to the vector store."""
-        self.vector_store.add_documents(docs)
+        # Shared embedding model (MiniLM: small, fast vectors for short news articles)
+        self.embedding_model = _get_embedding_model()
+        
+        # Get the index, sharing the client's connection pool size
+        self.index = self.pc.Index(self.index_name, pool_threads=PINECONE_POOL_THREADS)
+        
+        # Newest article date added during this process
+        self.latest_date = ""
+        
+        # Data-plane host for the asyncio client, looked up on first use
+        self.index_host: Optional[str] = None
+        
+        # In-memory copy of the index, so searches don't need a network round trip
+        self.local_index = LocalIndex(EMBEDDING_DIMENSION)
+        self._local_checked_at = time.monotonic()
+        self._local_current = True
+        self._resync_lock = threading.Lock()
+        self._sync_local_index()
+    
+    def _sync_local_index(self) -> None:
+        """
+        Load every stored vector into a fresh local index and swap it in.
+        
+        Searches keep using the current local index (or Pinecone) while
+        loading; if loading fails, they go on using Pinecone.
+        """
+        local_index = LocalIndex(EMBEDDING_DIMENSION)
+        try:
+            for ids in self.index.list():
+                vectors = list(self.index.fetch(ids=ids).vectors.values())
+                local_index.add(
+                    [vector.id for vector in vectors],
+                    [vector.values for vector in vectors],
+                    [dict(vector.metadata or {}) for vector in vectors]
+                )
+            
+            local_index.ready = True
+            self.local_index = local_index
+            self._local_current = True
+            print(f"Loaded {len(local_index)} documents into the local index")
+        except Exception as e:
+            print(f"Error loading the local index, searching Pinecone instead: {e}")
+    
+    def _local_index_is_current(self) -> bool:
+        """
+        Return whether searches can be served from the local index.
+        
+        Other processes (the CLI, the server) write to Pinecone without
+        updating this process's copy. At most every LOCAL_INDEX_CHECK_INTERVAL
+        seconds, Pinecone's vector count is compared with the local one; on a
+        mismatch, searches go to Pinecone while the local index is reloaded in
+        the background.
+        """
+        if not self.local_index.ready:
+            return False
+        
+        now = time.monotonic()
+        if now - self._local_checked_at < LOCAL_INDEX_CHECK_INTERVAL:
+            return self._local_current
+        self._local_checked_at = now
+        
+        try:
+            total_vector_count = self.index.describe_index_stats().total_vector_count
+        except Exception as e:
+            print(f"Error checking the local index against Pinecone: {e}")
+            return self._local_current
+        
+        self._local_current = total_vector_count == len(self.local_index)
+        if not self._local_current and self._resync_lock.acquire(blocking=False):
+            print(f"Local index has {len(self.local_index)} vectors, Pinecone {total_vector_count}: reloading")
+            
+            def resync() -> None:
+                try:
+                    self._sync_local_index()
+                finally:
+                    self._resync_lock.release()
+            
+            threading.Thread(target=resync, daemon=True).start()
+        
+        return self._local_current
+    
+    async def add_articles_async(self, articles: Iterable[Any]) -> None:
+        """
+        Split, embed and store news articles without blocking the event loop.
+        
+        Embedding runs in a worker thread, then all upsert batches are sent
+        concurrently over Pinecone's asyncio client, so the total time is close
+        to that of the slowest batch rather than the sum of all of them.
+        """
+        ids, texts, metadatas = _article_chunks(articles)
+        embeddings = await asyncio.to_thread(self.embedding_model.embed_documents, texts)
+        
+        async with self.pc.IndexAsyncio(host=self._get_index_host()) as index:
+            await asyncio.gather(*[index.upsert(vectors=batch) for batch in _upsert_batches(ids, embeddings, metadatas)])
+        
+        # Inserting into the HNSW graph is CPU-bound, so keep it off the event loop too
+        await asyncio.to_thread(self._track_added, ids, embeddings, metadatas)
+    
+    def _track_added(self, ids: List[str], embeddings: List[List[float]], metadatas: List[Dict[str, Any]]) -> None:
+        """Mirror newly stored vectors locally and track the newest article date, used to fingerprint the index."""
+        self.local_index.add(ids, embeddings, metadatas)
+        self.latest_date = max([self.latest_date] + [metadata.get("date", "") for metadata in metadatas])
+    
+    def _get_index_host(self) -> str:
+        """Return the index's data-plane host, looked up once (needed by the asyncio client)."""
+        if self.index_host is None:
+            self.index_host = self.pc.describe_index(self.index_name).host
+        return self.index_host
     
     def similar_search(self, query: str, k: int = 5) -> List[Document]:
         """Search for similar documents."""
-        return self.vector_store.similarity_search(query, k=k)
+        return self.similar_search_by_vector(self.embedding_model.embed_query(query), k=k)
+    
+    def similar_search_by_vector(self, embedding: List[float], k: int = 5) -> List[Document]:
+        """
+        Search for articles similar to an already computed query embedding.
+        
+        Chunks are scored individually, then grouped into their articles: the
+        result holds the k articles with the best-scoring chunks, each with its
+        matching chunks in article order.
+        """
+        if self._local_index_is_current():
+            chunks = [_document_from_metadata(metadata) for metadata in self.local_index.search(embedding, k * CHUNK_OVERFETCH)]
+        else:
+            response = self.index.query(vector=embedding, top_k=k * CHUNK_OVERFETCH, include_metadata=True, include_values=False)
+            chunks = self._documents_from_matches(response.matches)
+        
+        return _merge_chunks(chunks, k)
     
     def get_documents_by_source(self, source: str, limit: int = 10) -> List[Document]:
         """
@@ -63,56 +244,55 @@ class VectorStore:
             List of documents from the specified source
         """
         try:
-            # First, use a similar_search with a general query to get documents
-            all_docs = self.similar_search(f"{source} news", k=100)
-            
-            # Filter by source
-            source_docs = []
-            for doc in all_docs:
-                doc_source = doc.metadata.get('source', '')
-                if doc_source.lower() == source.lower():
-                    source_docs.append(doc)
-            
-            # Sort by date (newest first)
-            try:
-                source_docs.sort(key=lambda x: datetime.fromisoformat(x.metadata.get('date', '2000-01-01')), reverse=True)
-            except Exception as e:
-                print(f"Error sorting documents by date: {e}")
+            # Query with a general source embedding, filtered to the source on the server
+            response = self.index.query(
+                vector=self.embedding_model.embed_query(f"{source} news"),
+                top_k=300,
+                filter={"source": {"$eq": source.lower()}},
+                include_metadata=True,
+                include_values=False
+            )
+            source_docs = _merge_chunks(self._documents_from_matches(response.matches))
             
-            # Limit the number of results
-            return source_docs[:limit]
+            # Newest `limit` documents, without sorting the whole candidate list
+            return heapq.nlargest(limit, source_docs, key=_date_epoch)
             
         except Exception as e:
             print(f"Error retrieving documents by source: {e}")
             return []
     
+    def _documents_from_matches(self, matches: List[Any]) -> List[Document]:
+        """Build Documents from Pinecone query matches."""
+        return [_document_from_metadata(match.metadata or {}) for match in matches]
+    
     def delete_documents(self, ids: List[str]) -> None:
         """Delete documents from the vector store by ID."""
-        self.vector_store.delete(ids)
+        self.index.delete(ids=ids)
+        self.local_index.delete(ids)
     
     def clear_vector_store(self) -> None:
         """Delete all documents from the vector store."""
         self.index.delete(delete_all=True)
+        self.local_index.clear()
     
     def get_all_document_urls(self) -> Set[str]:
-        """Retrieve all URLs from documents in the vector store."""
+        """
+        Retrieve all URLs from documents in the vector store.
+        
+        IDs are enumerated page by page with list() and their metadata fetched
+        in the same pages, so no similarity scoring is done and there is no cap
+        on the number of documents.
+        """
         try:
-            # Fetch all vectors with their metadata
-            fetch_response = self.index.query(
-                vector=[0.0] * 768,  # Dummy vector, we only care about metadata
-                top_k=10000,         # Set high to get all documents
-                include_metadata=True,
-                include_values=False
-            )
-            
-            # Extract URLs from metadata
             urls = set()
-            if hasattr(fetch_response, 'matches'):
-                for match in fetch_response.matches:
-                    if hasattr(match, 'metadata') and match.metadata:
-                        url = match.metadata.get('url', '')
-                        if url:
-                            urls.add(url)
+            for ids in self.index.list():
+                fetch_response = self.index.fetch(ids=ids)
+                
+                # Extract URLs from metadata
+                for vector in fetch_response.vectors.values():
+                    url = (vector.metadata or {}).get('url', '')
+                    if url:
+                        urls.add(url)
             
             return urls
             
@@ -129,18 +309,84 @@ class VectorStore:
             print(f"Error getting vector store stats: {e}")
             return {}
 
-def document_from_article(article: Any) -> Document:
-    """Convert a news article to a Document for vector storage."""
-    metadata = {
-        "title": article.title,
-        "url": article.url,
-        "date": article.date.isoformat() if hasattr(article.date, 'isoformat') else article.date,
-        "source": article.source
-    }
-    
-    # Create document with article content and metadata
-    return Document(page_content=article.content, metadata=metadata)
-
-def documents_from_articles(articles: List[Any]) -> List[Document]:
-    """Convert multiple news articles to Documents."""
-    return [document_from_article(article) for article in articles] 
\ No newline at end of file
+def _date_epoch(doc: Document) -> float:
+    """Publication time of a document as epoch seconds (0 if unknown)."""
+    date_epoch = doc.metadata.get("date_epoch")
+    if date_epoch is not None:
+        return date_epoch
+    
+    # Documents stored before date_epoch was recorded only have the ISO date
+    try:
+        return datetime.fromisoformat(doc.metadata.get("date", "")).timestamp()
+    except (TypeError, ValueError):
+        return 0
+
+def _merge_chunks(chunks: List[Document], k: Optional[int] = None) -> List[Document]:
+    """
+    Group chunks into one Document per article, keeping the order in which articles first appear.
+    
+    Each article's chunks are joined in article order. Only the first k
+    articles are kept when k is given.
+    """
+    articles: Dict[str, List[Document]] = {}
+    for chunk in chunks:
+        # Vectors stored before chunking hold a whole article and have no parent_url
+        parent_url = chunk.metadata.get("parent_url", chunk.metadata.get("url", ""))
+        if parent_url not in articles:
+            if k is not None and len(articles) == k:
+                continue
+            articles[parent_url] = []
+        articles[parent_url].append(chunk)
+    
+    docs = []
+    for article_chunks in articles.values():
+        article_chunks.sort(key=lambda chunk: chunk.metadata.get("chunk_id", 0))
+        metadata = {key: value for key, value in article_chunks[0].metadata.items() if key != "chunk_id"}
+        docs.append(Document(page_content="\n".join(chunk.page_content for chunk in article_chunks), metadata=metadata))
+    return docs
+
+def _document_from_metadata(metadata: Dict[str, Any]) -> Document:
+    """Build a Document from stored vector metadata, taking the text out of the metadata."""
+    metadata = dict(metadata)
+    return Document(page_content=metadata.pop("text", ""), metadata=metadata)
+
+def _upsert_batches(ids: List[str], embeddings: List[List[float]], metadatas: List[Dict[str, Any]]) -> List[List[Tuple[str, List[float], Dict[str, Any]]]]:
+    """Build (id, values, metadata) Pinecone vectors, split into upsert-sized batches."""
+    vectors = list(zip(ids, embeddings, metadatas))
+    return [vectors[i:i + UPSERT_BATCH_SIZE] for i in range(0, len(vectors), UPSERT_BATCH_SIZE)]
+
+def document_id(url: str) -> str:
+    """Return the deterministic ID for an article URL."""
+    return hashlib.sha1(url.encode()).hexdigest()
+
+def vector_id(url: str, chunk_id: int) -> str:
+    """Return the deterministic vector ID for an article chunk."""
+    return f"{document_id(url)}-{chunk_id}"
+
+def _article_chunks(articles: Iterable[Any]) -> Tuple[List[str], List[str], List[Dict[str, Any]]]:
+    """
+    Split news articles into chunks for vector storage.
+    
+    Returns parallel lists of vector IDs, chunk texts and chunk metadata, built
+    in a single pass. The text is also stored in the metadata, to be returned
+    with query matches.
+    """
+    splitter = _get_text_splitter()
+    ids, texts, metadatas = [], [], []
+    for article in articles:
+        date_epoch = int(article.date.timestamp())
+        date = article.date.isoformat()
+        for chunk_id, text in enumerate(splitter.split_text(article.content)):
+            ids.append(vector_id(article.url, chunk_id))
+            texts.append(text)
+            metadatas.append({
+                "title": article.title,
+                "url": article.url,
+                "parent_url": article.url,
+                "chunk_id": chunk_id,
+                "date_epoch": date_epoch,
+                "date": date,
+                "source": article.source,
+                "text": text
+            })
+    return ids, texts, metadatas